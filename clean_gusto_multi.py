@@ -1,99 +1,148 @@
 import pandas as pd
+import numpy as np
 import re
-from datetime import datetime
 import io
+import os
+import mmap
+import functools
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import ahocorasick
+except ImportError:  # optional; district matching falls back to the compiled regex
+    ahocorasick = None
+
+# --- Compiled Patterns ---
+
+def _ordered_keyword_pattern(keyword_groups):
+    """Compile keyword groups into one regex that reports the first group found.
+
+    Each group becomes its own lookahead alternative, tried in order, so
+    match.lastindex is the 1-based index of the first group with a keyword
+    anywhere in the text - the same answer as a chain of `in` checks.
+    """
+    return re.compile(
+        "^(?:" + "|".join(
+            "(?=.*?(" + "|".join(re.escape(k) for k in keywords) + "))"
+            for keywords in keyword_groups
+        ) + ")",
+        re.DOTALL
+    )
+
+note_entry_split_pattern = re.compile(r'\n+|(?=\d{1,2}:\d{2}(?:\s?[APMapm]{2})?\s*-\s*\d{1,2}:\d{2})')
+leading_time_pattern = re.compile(r'^\d{1,2}:\d{2}')
+initials_pattern = re.compile(r'\b[A-Z]{1,3}\b')
+time_prefix_pattern = re.compile(r'^\d{1,2}:\d{2}(?: ?[APMapm]{2})?\s*-\s*\d{1,2}:\d{2}(?: ?[APMapm]{2})?\s*>?')
+time_prefix_spaced_pattern = re.compile(r'^\d{1,2}:\d{2}(?: ?[APMapm]{2})?\s*-\s*\d{1,2}:\d{2}(?: ?[APMapm]{2})?\s*>?\s*')
+contractor_line_pattern = re.compile(r'Hours for (.+?) \(Contractor\)')
+contractor_header_line_pattern = re.compile(rb'^(?=[^\n]*Hours for)(?=[^\n]*\(Contractor\))[^\n]*\n?', re.MULTILINE)
+contractor_header_bytes_pattern = re.compile(rb'\n\s*"Hours for ([^"]+) \(Contractor\)"\s*\n')
+line_padding_pattern = re.compile(rb'[ \t\r\f\v]*\n\s*')
 
 # --- Utility Functions ---
 
-def estimate_hours(time_range):
-    if pd.isna(time_range) or "-" not in time_range:
+def _parse_clock(text, with_minutes):
+    """Parse "9:30 AM" (or "9 AM") into minutes since midnight, or None if malformed."""
+    tokens = text.split()
+    if len(tokens) != 2 or tokens[1].upper() not in ("AM", "PM"):
         return None
-    try:
-        start, end = [t.strip() for t in time_range.split("-")]
-        fmt = "%I:%M %p" if ":" in start else "%I %p"
-        start_dt = datetime.strptime(start, fmt)
-        end_dt = datetime.strptime(end, fmt)
-        if end_dt < start_dt:
-            end_dt = end_dt.replace(day=end_dt.day + 1)
-        return round((end_dt - start_dt).seconds / 3600, 3)
-    except:
+    if with_minutes:
+        hour, _, minute = tokens[0].partition(":")
+    else:
+        hour, minute = tokens[0], "0"
+    if not (hour.isdecimal() and minute.isdecimal() and len(hour) <= 2 and len(minute) <= 2):
+        return None
+    hour, minute = int(hour), int(minute)
+    if not (1 <= hour <= 12 and minute <= 59):
         return None
+    if tokens[1].upper() == "PM":
+        return (hour % 12 + 12) * 60 + minute
+    return (hour % 12) * 60 + minute
 
-def split_manual_note_entries(note):
-    if pd.isna(note):
-        return []
-    entries = re.split(r'\n+', note.strip())
-    final_entries = []
-    for entry in entries:
-        parts = re.split(r'(?=\d{1,2}:\d{2}(?:\s?[APMapm]{2})?\s*-\s*\d{1,2}:\d{2})', entry)
-        final_entries.extend([p.strip() for p in parts if p.strip()])
-    return final_entries
-
-def extract_student_initials(note):
-    if pd.isna(note): return None
-    parts = re.split(r'>', str(note).strip())
-
-    # Skip time range if it's the first part
-    if re.match(r'^\d{1,2}:\d{2}', parts[0]):
-        parts = parts[1:]
-
-    # Look in the next block (typically initials)
-    if len(parts) >= 2:
-        initials_block = parts[1]
-    else:
+def estimate_hours(time_range):
+    # Missing values short-circuit here so NaN objects never fill the cache
+    if pd.isna(time_range):
         return None
+    return _estimate_hours(time_range)
 
-    # Match 2- or 3-letter uppercase initials (including dotted forms)
-    initials = re.findall(r'\b[A-Z]{1,3}\b', initials_block.upper())
-    return ", ".join(initials) if initials else None
-
-
-
-def extract_task(note):
-    if pd.isna(note): return None
-    parts = note.split(">")
-    if len(parts) >= 3:
-        return parts[2].split("-")[0].strip()
-    return None
-
-def standardize_task(task):
-    if pd.isna(task): return None
-    t = task.lower().strip()
-    if "report" in t: return "Report Writing"
-    elif "testing" in t: return "Testing"
-    elif "interview" in t or "observation" in t: return "Interview and Observation"
-    elif "eval" in t or "planning" in t: return "Eval Planning"
-    elif "scoring" in t or "upload" in t: return "Scoring and Uploading"
-    elif "meeting prep" in t: return "Meeting Prep"
-    elif "iep" in t: return "IEP Meeting Attendance"
-    elif "rating" in t: return "Rating Scales"
-    elif "guardian" in t or "parent" in t: return "Guardian Contact"
-    elif "teacher" in t: return "Teacher Contact"
-    elif "staff" in t: return "School Staff Contact"
-    elif "scheduling" in t: return "Scheduling"
-    elif "onboarding" in t: return "Onboarding"
-    elif "caseload" in t: return "Caseload Organization"
-    elif "pd" in t or "development" in t: return "Professional Development"
-    elif "email" in t or "communication" in t: return "Internal Communication"
-    elif "troubleshoot" in t or "tech" in t: return "Troubleshooting"
-    elif "waiting" in t: return "Waiting"
-    else: return task.title()
-
-def categorize_task(task):
-    eval_tasks = {
-        "Eval Planning", "Scheduling", "Guardian Contact", "Teacher Contact", "School Staff Contact",
-        "Rating Scales", "Eval Prep", "Waiting", "Testing", "Interview and Observation",
-        "Scoring and Uploading", "Report Writing", "Post Eval School Consultation",
-        "Meeting Prep", "IEP Meeting Attendance"
-    }
-    admin_tasks = {
-        "Onboarding", "Internal Communication", "Professional Development", "Caseload Organization", "Troubleshooting"
-    }
-    if task in eval_tasks:
-        return "Evaluation"
-    elif task in admin_tasks:
-        return "Admin"
-    return "Uncategorized"
+# Gusto exports repeat the same handful of time ranges, so cache the parsed result
+@functools.lru_cache(maxsize=4096)
+def _estimate_hours(time_range):
+    if "-" not in time_range:
+        return None
+    parts = time_range.split("-")
+    if len(parts) != 2:
+        return None
+    start, end = parts[0].strip(), parts[1].strip()
+    with_minutes = ":" in start
+    start_min = _parse_clock(start, with_minutes)
+    end_min = _parse_clock(end, with_minutes)
+    if start_min is None or end_min is None:
+        return None
+    # Ranges that cross midnight wrap around to the next day
+    return round((end_min - start_min) % 1440 / 60, 3)
+
+def map_unique(values, func):
+    """Apply a scalar parser once per distinct value and broadcast back by integer code."""
+    codes, uniques = pd.factorize(values)
+    # Code -1 marks missing values, which index the trailing func(None) slot
+    mapped = np.array([func(value) for value in uniques] + [func(None)], dtype=object)
+    return pd.Series(mapped[codes], index=values.index)
+
+def parse_gusto_dates(values):
+    """Parse a column of Gusto dates, taking the fixed-format fast path for MM/DD/YY."""
+    dates = pd.to_datetime(values, format="%m/%d/%y", errors="coerce", cache=True)
+    retry = dates.isna() & values.notna()
+    if retry.any():
+        dates[retry] = pd.to_datetime(values[retry], format="mixed", errors="coerce")
+    return dates
+
+# Ordered (keywords, label) pairs; the first rule with a keyword in the task wins
+task_keywords = [
+    (("report",), "Report Writing"),
+    (("testing",), "Testing"),
+    (("interview", "observation"), "Interview and Observation"),
+    (("eval", "planning"), "Eval Planning"),
+    (("scoring", "upload"), "Scoring and Uploading"),
+    (("meeting prep",), "Meeting Prep"),
+    (("iep",), "IEP Meeting Attendance"),
+    (("rating",), "Rating Scales"),
+    (("guardian", "parent"), "Guardian Contact"),
+    (("teacher",), "Teacher Contact"),
+    (("staff",), "School Staff Contact"),
+    (("scheduling",), "Scheduling"),
+    (("onboarding",), "Onboarding"),
+    (("caseload",), "Caseload Organization"),
+    (("pd", "development"), "Professional Development"),
+    (("email", "communication"), "Internal Communication"),
+    (("troubleshoot", "tech"), "Troubleshooting"),
+    (("waiting",), "Waiting"),
+]
+
+task_pattern = _ordered_keyword_pattern(keywords for keywords, _ in task_keywords)
+task_labels = [label for _, label in task_keywords]
+
+def standardize_tasks(tasks):
+    """Map raw task strings to standard labels; unmatched tasks are title-cased."""
+    matches = tasks.str.lower().str.strip().str.extract(task_pattern)
+    matched = matches.notna().to_numpy()
+    labels = pd.Series(np.array(task_labels)[matched.argmax(axis=1)], index=tasks.index)
+    return labels.where(matched.any(axis=1), tasks.str.title()).where(tasks.notna())
+
+eval_tasks = {
+    "Eval Planning", "Scheduling", "Guardian Contact", "Teacher Contact", "School Staff Contact",
+    "Rating Scales", "Eval Prep", "Waiting", "Testing", "Interview and Observation",
+    "Scoring and Uploading", "Report Writing", "Post Eval School Consultation",
+    "Meeting Prep", "IEP Meeting Attendance"
+}
+admin_tasks = {
+    "Onboarding", "Internal Communication", "Professional Development", "Caseload Organization", "Troubleshooting"
+}
+task_categories = {
+    **{task: "Evaluation" for task in eval_tasks},
+    **{task: "Admin" for task in admin_tasks}
+}
 
 # --- District Cleanup ---
 
@@ -126,172 +175,251 @@ approved_districts = {
     "Waltham", "Wareham", "Acton-Boxborough", "West Springfield", "Chelsea", "New Heights", "Lilypad"
 }
 
-def extract_possible_district_from_note(note):
-    if pd.isna(note): return None
-    note = str(note).strip()
-    note = re.sub(r'^\d{1,2}:\d{2}(?: ?[APMapm]{2})?\s*-\s*\d{1,2}:\d{2}(?: ?[APMapm]{2})?\s*>?', '', note).strip()
-    return note.split(">")[0].strip() if ">" in note else note
+# Aliases are checked in dict order, so consecutive aliases for the same district share a group
+district_alias_groups = [
+    (tuple(alias.lower() for alias, _ in aliases), standard)
+    for standard, aliases in itertools.groupby(district_aliases.items(), key=lambda item: item[1])
+]
+district_alias_pattern = _ordered_keyword_pattern(aliases for aliases, _ in district_alias_groups)
+district_alias_labels = [standard for _, standard in district_alias_groups]
+
+# With pyahocorasick installed, one automaton pass finds every alias in the text
+district_alias_automaton = None
+if ahocorasick is not None:
+    district_alias_automaton = ahocorasick.Automaton()
+    for order, (alias, standard) in enumerate(district_aliases.items()):
+        if alias.lower() not in district_alias_automaton:
+            district_alias_automaton.add_word(alias.lower(), (order, standard))
+    district_alias_automaton.make_automaton()
+
+def match_district_alias(lowered):
+    """Return the district for the earliest-listed alias found in lowercased text, or None."""
+    if district_alias_automaton is not None:
+        hit = min(district_alias_automaton.iter(lowered), key=lambda item: item[1][0], default=None)
+        return hit[1][1] if hit else None
+    match = district_alias_pattern.match(lowered)
+    return district_alias_labels[match.lastindex - 1] if match else None
 
 def standardize_district(raw_text):
     if pd.isna(raw_text): return None
-    raw = str(raw_text).strip()
-    if re.match(r'^\d{1,2}:\d{2}', raw):
+    return _standardize_district(str(raw_text))
+
+@functools.lru_cache(maxsize=2048)
+def _standardize_district(raw_text):
+    raw = raw_text.strip()
+    if leading_time_pattern.match(raw):
         return None
-    lowered = raw.lower()
-    for alias, standard in district_aliases.items():
-        if alias.lower() in lowered:
-            return standard
+    standard = match_district_alias(raw.lower())
+    if standard:
+        return standard
     return raw if raw in approved_districts else None
 
+# --- Rates ---
+
+# Hourly contractor rates, keyed by psychologist first name
+psychologist_rates = {
+    "Nancy": 95, "Kathleen": 95, "David": 95, "Melissa": 95, "Emily": 95, "Tarik": 95,
+    "Angela": 70, "Caroline": 70, "Julie": 70, "Lexi": 70, "Shirley": 70
+}
+
+# Billing fee per case, keyed by district
+district_fees = {
+    "Lawrence": 1000, "Greenfield": 900, "Ashland": 1000, "Blue Hills": 900,
+    "Bridgewater-Raynham": 1875, "Easthampton": 1875, "Holbrook": 1500,
+    "Milton": 1000, "Randolph": 800, "Salem": 950, "Tewksbury": 1500,
+    "Waltham": 1000, "Wareham": 1200, "West Springfield": 800
+}
+
+def estimate_costs(hours, rates):
+    """Multiply hours by hourly rates as plain float arrays."""
+    return hours.to_numpy(dtype=float) * rates.to_numpy(dtype=float)
+
+def add_estimated_costs(df):
+    """Add an Estimated Cost column unless one was already computed upstream."""
+    if "Estimated Cost" in df.columns:
+        return
+    if "Hourly Rate" in df.columns:
+        rates = df["Hourly Rate"]
+    else:
+        rates = df["Psychologist"].str.split(n=1).str[0].map(psychologist_rates)
+    df["Estimated Cost"] = estimate_costs(df["Estimated Hours"], rates)
+
 # --- Main Parsing Logic ---
 
-def process_block(block_lines, psychologist_name):
-    block_str = ''.join(block_lines)
-    try:
-        df = pd.read_csv(io.StringIO(block_str))
-        if "Total hours" in df.columns:
-            df["Total hours"] = pd.to_numeric(df["Total hours"], errors="coerce")
-            df = df[df["Total hours"] > 0].copy()
-        if df.empty:
-            return []
-    except Exception as e:
-        print(f"⚠️ Skipping block for {psychologist_name} due to read error: {e}")
-        return []
+# Columns produced for every parsed Gusto entry, in output order
+gusto_columns = [
+    "Date", "Hours", "Note", "Estimated Hours", "Student Initials",
+    "District", "Task", "Psychologist"
+]
+
+# Low-cardinality label columns kept as categoricals in the parsed output
+category_columns = [
+    "District", "Psychologist", "Task", "Standardized Task", "Task Category", "Student Initials"
+]
+
+# Columns of each record built from an uploaded Gusto export, in output order
+upload_columns = [
+    "Date", "Psychologist", "Hours", "District", "Student Initials", "Raw Task",
+    "Time Entry", "Note", "Hours Column", "Notes Column"
+]
+
+def process_block(block, psychologist_name):
+    # Read errors propagate to the block-level handler in parse_gusto_file
+    df = pd.read_csv(io.BytesIO(block), engine="c")
+    if "Total hours" in df.columns:
+        df["Total hours"] = pd.to_numeric(df["Total hours"], errors="coerce")
+        df = df[df["Total hours"] > 0].copy()
+    if df.empty:
+        return pd.DataFrame(columns=gusto_columns)
+
+    date_col = "Date" if "Date" in df.columns else '"Date"'
+    hours_cols = [col for col in df.columns if col.startswith("Hours")]
+    notes_cols = [col for col in df.columns if col.startswith("Notes")]
+    if date_col not in df.columns or not hours_cols or not notes_cols:
+        return pd.DataFrame(columns=gusto_columns)
+
+    dates = parse_gusto_dates(df[date_col])
+
+    # Stack every Hours/Notes pair into one long frame, keeping row-major order
+    entries = pd.concat([
+        pd.DataFrame({"Date": dates, "Hours": df[h_col], "Note": df[n_col]})
+        for h_col, n_col in zip(hours_cols, notes_cols)
+    ]).sort_index(kind="stable").reset_index(drop=True)
+
+    # Entries without a date or a parseable time range never make it into the report
+    entries["Estimated Hours"] = pd.to_numeric(map_unique(entries["Hours"], estimate_hours))
+    entries = entries[entries["Date"].notna() & (entries["Estimated Hours"] > 0)]
+    if entries.empty:
+        return pd.DataFrame(columns=gusto_columns)
+
+    # Split manual notes into sub-entries; blank notes are kept as a single entry
+    notes = entries["Note"]
+    sub_notes = (
+        notes.fillna("").astype(str).str.strip()
+        .str.split(note_entry_split_pattern).explode()
+        .str.strip()
+    )
+    sub_notes = sub_notes[sub_notes != ""]
+    blank = notes.index.difference(sub_notes.index)
+    sub_notes = pd.concat([sub_notes, notes.loc[blank]]).sort_index(kind="stable")
+
+    rows = entries.loc[sub_notes.index].assign(Note=sub_notes.to_numpy())
+    rows["Note Count"] = sub_notes.groupby(level=0).transform("size").to_numpy()
+    rows = rows.reset_index(drop=True)
+
+    # Missing notes parse the same as empty ones, so work on filled text throughout
+    note_text = rows["Note"].fillna("").astype(str).str.strip()
+    parts = note_text.str.split(">")
+    part_count = parts.str.len()
+
+    # Initials sit in the second block, or the third when the note leads with a time range
+    has_time = parts.str[0].str.match(leading_time_pattern)
+    initials_block = parts.str[2].where(has_time, parts.str[1]).fillna("")
+    initials = initials_block.str.upper().str.findall(initials_pattern)
+
+    # Split each entry's hours across its sub-notes and then across the students named
+    student_count = initials.str.len().clip(lower=1)
+    rows["Estimated Hours"] = rows["Estimated Hours"] / rows["Note Count"] / student_count
+
+    district_raw = (
+        note_text.str.replace(time_prefix_pattern, "", regex=True)
+        .str.strip().str.split(">").str[0].str.strip()
+    )
+    rows["District"] = map_unique(district_raw, standardize_district)
+    rows["Task"] = parts.str[2].fillna("").str.split("-").str[0].str.strip().where(part_count >= 3)
 
-    results = []
+    # One row per student; notes without initials keep a single "None" row
+    students = initials.explode().fillna("None")
+    rows = rows.loc[students.index]
+    rows["Student Initials"] = students.to_numpy()
+    rows["Psychologist"] = psychologist_name
 
-    for _, row in df.iterrows():
-        date_raw = row.get("Date", row.get('"Date"'))
-        try:
-            date = pd.to_datetime(date_raw, errors='coerce')
-        except:
-            continue
-        if pd.isna(date):
-            continue
+    return rows[gusto_columns].reset_index(drop=True)
 
-        hours_cols = [col for col in row.index if col.startswith("Hours")]
-        notes_cols = [col for col in row.index if col.startswith("Notes")]
 
-        for h_col, n_col in zip(hours_cols, notes_cols):
-            h = row[h_col]
-            n = row[n_col]
-            if not h and not n:
-                continue
+def _process_block_task(task):
+    """Run process_block for one (psychologist, block) pair, returning (frame, error)."""
+    psychologist, block = task
+    try:
+        return process_block(block, psychologist), None
+    except Exception as e:
+        return None, str(e)
 
-            est_hours = estimate_hours(h)
-            split_notes = split_manual_note_entries(n)
-            if not split_notes:
-                split_notes = [n]
-
-            for sub_note in split_notes:
-                initials = extract_student_initials(sub_note)
-                student_list = [s.strip() for s in str(initials).split(",") if s.strip()]
-                student_count = len(student_list) if student_list else 1
-                split_hours = est_hours / len(split_notes) / student_count if est_hours else 0
-                district_raw = extract_possible_district_from_note(sub_note)
-
-                for student in student_list or [None]:
-                    task = extract_task(sub_note)
-                    std_task = standardize_task(task)
-
-                    try:
-                        results.append({
-                            "Date": date,
-                            "Hours": h,
-                            "Note": sub_note,
-                            "Estimated Hours": split_hours,
-                            "Student Initials": student,
-                            "District": standardize_district(district_raw),
-                            "Task": task,
-                            "Standardized Task": std_task,
-                            "Task Category": categorize_task(std_task),
-                            "Psychologist": psychologist_name
-                        })
-                    except Exception as e:
-                        print(f"⚠️ Skipping row due to error: {e}")
-
-    return results
-
-
-def parse_gusto_file(filepath):
-    import numpy as np
-
-    cleaned_rows = []
-
-    # Step 1: Read raw Gusto file line by line
-    with open(filepath, "r", encoding="utf-8") as f:
-        lines = f.readlines()
+def parse_gusto_file(filepath, max_workers=1):
+    block_frames = []
 
     psychologist = None
-    block = []
-
-    # Step 2: Group lines into blocks per psychologist
-    for line in lines:
-        if "Hours for" in line and "(Contractor)" in line:
-            if block:
-                try:
-                    cleaned_rows += process_block(block, psychologist)
-                except Exception as e:
-                    print(f"⚠️ Skipping block for {psychologist} due to error: {e}")
-                block = []
-
-            match = re.search(r'Hours for (.+?) \(Contractor\)', line)
-            psychologist = match.group(1) if match else "Unknown"
-        elif line.strip():
-            block.append(line)
-
-    # Step 3: Process final block
-    if block:
-        try:
-            cleaned_rows += process_block(block, psychologist)
-        except Exception as e:
-            print(f"⚠️ Skipping final block for {psychologist} due to error: {e}")
-
-    # Step 4: Deep-clean each row before DataFrame conversion
-    safe_rows = []
-    for i, row in enumerate(cleaned_rows):
-        try:
-            for key, value in row.items():
-                if isinstance(value, (list, tuple, dict, np.ndarray)):
-                    raise ValueError(f"Field '{key}' has unsupported type: {type(value)}")
-            safe_rows.append(row)
-        except Exception as e:
-            print(f"⚠️ Dropping bad row {i} ({row.get('Psychologist', 'Unknown')}): {e}")
-
-    # Step 5: Build DataFrame
-    if not safe_rows:
+    blocks = []
+
+    # Step 1: Map the raw Gusto file instead of materializing it line by line
+    with open(filepath, "rb") as f:
+        if os.fstat(f.fileno()).st_size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                # Step 2: Slice the bytes between "Hours for ... (Contractor)" lines into per-psychologist blocks
+                block_start = 0
+                for header in contractor_header_line_pattern.finditer(data):
+                    blocks.append((psychologist, data[block_start:header.start()]))
+                    match = contractor_line_pattern.search(header.group(0).decode("utf-8"))
+                    psychologist = match.group(1) if match else "Unknown"
+                    block_start = header.end()
+                blocks.append((psychologist, data[block_start:]))
+
+    # Step 3: Parse the non-empty blocks; blocks are small, so a process pool only
+    # pays off for very large exports and is opt-in (max_workers=None uses every CPU)
+    tasks = [(psychologist, block) for psychologist, block in blocks if block.strip()]
+    final_task = len(tasks) - 1 if blocks and blocks[-1][1].strip() else None
+    if max_workers == 1 or len(tasks) < 2:
+        results = [_process_block_task(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(_process_block_task, tasks))
+
+    for i, ((psychologist, _), (block_df, error)) in enumerate(zip(tasks, results)):
+        if error is not None:
+            label = "final block" if i == final_task else "block"
+            print(f"⚠️ Skipping {label} for {psychologist} due to error: {error}")
+            continue
+        if not block_df.empty:
+            block_frames.append(block_df)
+
+    # Step 4: Stack the typed per-block frames (process_block only emits scalar fields)
+    if block_frames:
+        df = pd.concat(block_frames, ignore_index=True)
+    else:
+        # Keep the output columns so the reports still run on an empty frame
         print("⚠️ No valid rows parsed — returning empty DataFrame")
-        return pd.DataFrame()
+        df = pd.DataFrame(columns=gusto_columns)
 
-    df = pd.DataFrame(safe_rows)
+    # Standardize and categorize tasks in one pass over the column
+    std_tasks = standardize_tasks(df["Task"])
+    df.insert(df.columns.get_loc("Task") + 1, "Standardized Task", std_tasks)
+    df.insert(df.columns.get_loc("Task") + 2, "Task Category", std_tasks.map(task_categories).fillna("Uncategorized"))
 
-    # Step 6: Filter for meaningful work
+    # Step 5: Filter for meaningful work
     if "Estimated Hours" in df.columns:
         df["Estimated Hours"] = pd.to_numeric(df["Estimated Hours"], errors="coerce").fillna(0)
         df = df[df["Estimated Hours"] > 0].copy()
 
+    # Step 6: Store repeated labels as categoricals so grouping works on integer codes
+    df[category_columns] = df[category_columns].astype("category")
+
+    # Step 7: Add hourly rate and cost columns once for every report downstream
+    df["Psychologist Clean"] = df["Psychologist"].str.split(n=1).str[0]
+    df["Hourly Rate"] = df["Psychologist Clean"].map(psychologist_rates)
+    df["Estimated Cost"] = estimate_costs(df["Estimated Hours"], df["Hourly Rate"])
+
     return df
 
 
 
 
 def generate_monthly_expense_summary(df, output_filename):
-    # Ensure date is datetime
-    df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
-    df["Month"] = df["Date"].dt.to_period("M")
-
-    # Define hourly rates again (used here if not in DataFrame already)
-    psychologist_rates = {
-        "Nancy": 95, "Kathleen": 95, "David": 95, "Melissa": 95, "Emily": 95, "Tarik": 95,
-        "Angela": 70, "Caroline": 70, "Julie": 70, "Lexi": 70, "Shirley": 70
-    }
-
-    # Fill in rate/cost if not already in DataFrame
-    if "Hourly Rate" not in df.columns:
-        df["Psychologist Clean"] = df["Psychologist"].apply(lambda x: x.split()[0] if isinstance(x, str) else x)
-        df["Hourly Rate"] = df["Psychologist Clean"].map(psychologist_rates)
-    if "Estimated Cost" not in df.columns:
-        df["Estimated Cost"] = df["Estimated Hours"] * df["Hourly Rate"]
+    # Ensure date is datetime, on a copy so the caller's frame is left untouched
+    dates = pd.to_datetime(df["Date"], errors="coerce")
+    df = df.assign(Date=dates, Month=dates.dt.to_period("M"))
+
+    # Fill in cost if not already in DataFrame
+    add_estimated_costs(df)
 
     # Group by month
     monthly_expense = df.groupby("Month")["Estimated Cost"].sum().reset_index()
@@ -316,7 +444,8 @@ def generate_student_task_breakdown(df, output_filename):
         columns="Standardized Task",
         values="Estimated Hours",
         aggfunc="sum",
-        fill_value=0
+        fill_value=0,
+        observed=True
     )
 
     # Add total column
@@ -328,43 +457,49 @@ def generate_student_task_breakdown(df, output_filename):
     print(f"📊 Student task breakdown saved to: {output_filename}")
 
 def generate_case_financial_report(df, output_filename):
-    # Define psychologist hourly rates
-    psychologist_rates = {
-        "Nancy": 95, "Kathleen": 95, "David": 95, "Melissa": 95, "Emily": 95, "Tarik": 95,
-        "Angela": 70, "Caroline": 70, "Julie": 70, "Lexi": 70, "Shirley": 70
-    }
-
-    # Define billing fee per district
-    district_fees = {
-        "Lawrence": 1000, "Greenfield": 900, "Ashland": 1000, "Blue Hills": 900,
-        "Bridgewater-Raynham": 1875, "Easthampton": 1875, "Holbrook": 1500,
-        "Milton": 1000, "Randolph": 800, "Salem": 950, "Tewksbury": 1500,
-        "Waltham": 1000, "Wareham": 1200, "West Springfield": 800
-    }
-
-    # Create Case ID
-    df["Case ID"] = df["Student Initials"].fillna("") + " | " + df["District"].fillna("")
-
-    # Normalize psychologist names and map hourly rate
-    df["Psychologist Clean"] = df["Psychologist"].apply(lambda x: x.split()[0] if isinstance(x, str) else x)
-    df["Hourly Rate"] = df["Psychologist Clean"].map(psychologist_rates)
-    df["Estimated Cost"] = df["Estimated Hours"] * df["Hourly Rate"]
-
-    # Group by Case ID and aggregate relevant data
-    case_summary = df.groupby("Case ID").agg({
-        "Student Initials": "first",
-        "District": "first",
+    # Blank out missing case keys on a copy, keeping categoricals as integer codes
+    case_keys = ["Student Initials", "District"]
+    filled = {}
+    for col in case_keys:
+        values = df[col]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            if "" not in values.cat.categories:
+                values = values.cat.add_categories([""])
+        else:
+            values = values.astype(object)
+        filled[col] = values.fillna("")
+    df = df.assign(**filled)
+
+    # Reuse the cost computed for the cleaned report when there is one
+    add_estimated_costs(df)
+
+    # Group by case and aggregate relevant data
+    case_summary = df.groupby(case_keys, observed=True, sort=False).agg({
         "Estimated Hours": "sum",
         "Estimated Cost": "sum",
-        "Psychologist": lambda x: ", ".join(sorted(set(filter(pd.notna, x)))),
         "Date": ["min", "max"]
     })
 
     # Flatten multi-index from aggregation
-    case_summary.columns = ['Student Initials', 'District', 'Estimated Hours', 'Estimated Cost',
-                            'Psychologists', 'Start Date', 'End Date']
+    case_summary.columns = ['Estimated Hours', 'Estimated Cost', 'Start Date', 'End Date']
+
+    # Join each case's distinct psychologists in sorted order
+    psychologists = (
+        df[case_keys + ["Psychologist"]].dropna(subset=["Psychologist"])
+        .astype({"Psychologist": str})
+        .drop_duplicates()
+        .sort_values("Psychologist")
+        .groupby(case_keys, observed=True, sort=False)["Psychologist"].agg(", ".join)
+    )
+    case_summary.insert(2, "Psychologists", psychologists.reindex(case_summary.index, fill_value=""))
     case_summary = case_summary.reset_index()
 
+    # Build the Case ID on the summary rows only, one string per case
+    case_summary.insert(0, "Case ID", (
+        case_summary["Student Initials"].astype(str) + " | " + case_summary["District"].astype(str)
+    ))
+    case_summary = case_summary.sort_values("Case ID", kind="stable", ignore_index=True)
+
     # Map revenue and compute profit
     case_summary["Revenue"] = case_summary["District"].map(district_fees)
     case_summary["Profit"] = case_summary["Revenue"] - case_summary["Estimated Cost"]
@@ -385,31 +520,27 @@ def process_gusto_file(file_content):
     5. Embedded metadata in notes
     """
     try:
-        # Step 1: Split into psychologist blocks
+        # Work on the raw bytes so each block goes straight to the C CSV parser
+        if isinstance(file_content, str):
+            file_content = file_content.encode('utf-8')
+        
+        # Step 1: Locate psychologist blocks
         # Format: "Hours for NAME (Contractor)"
-        sections = re.split(r'\n\s*"Hours for ([^"]+) \(Contractor\)"\s*\n', file_content)
+        headers = list(contractor_header_bytes_pattern.finditer(file_content))
         
         all_records = []
-        current_contractor = None
         processed_blocks = 0
         error_blocks = 0
         
-        for i, section in enumerate(sections):
-            if i == 0:  # Skip header section
-                continue
-                
-            if i % 2 == 1:  # Contractor name
-                current_contractor = section.strip()
-                continue
-                
+        for i, header in enumerate(headers):
+            current_contractor = header.group(1).decode('utf-8').strip()
+            block_end = headers[i + 1].start() if i + 1 < len(headers) else len(file_content)
+            
             # Step 2: Process each contractor's block
             try:
-                # Clean up the section data - remove empty lines and extra whitespace
-                cleaned_lines = [line.strip() for line in section.split('\n') if line.strip()]
-                cleaned_section = '\n'.join(cleaned_lines)
-                
-                # Read CSV data
-                df = pd.read_csv(io.StringIO(cleaned_section))
+                # Strip every line and drop blank ones in one pass over the bytes, then read CSV data
+                block = line_padding_pattern.sub(b'\n', file_content[header.end():block_end]).strip()
+                df = pd.read_csv(io.BytesIO(block), engine='c')
                 
                 # Skip if no data
                 if df.empty:
@@ -418,17 +549,8 @@ def process_gusto_file(file_content):
                 # Step 3: Handle date parsing
                 date_col = '"Date"' if '"Date"' in df.columns else 'Date'
                 if date_col in df.columns:
-                    # Try different date formats
-                    for date_format in ['%m/%d/%y', '%m/%d/%Y']:
-                        try:
-                            df['Date'] = pd.to_datetime(df[date_col].str.strip('"'), format=date_format)
-                            break
-                        except:
-                            continue
-                    
-                    # If specific formats fail, try automatic parsing
-                    if 'Date' not in df.columns:
-                        df['Date'] = pd.to_datetime(df[date_col].str.strip('"'), errors='coerce')
+                    # Parse the whole column at once, falling back per value for other formats
+                    df['Date'] = parse_gusto_dates(df[date_col].str.strip('"'))
                     
                     # Drop rows with invalid dates
                     df = df.dropna(subset=['Date'])
@@ -438,39 +560,36 @@ def process_gusto_file(file_content):
                         continue
                     
                     # Step 4: Process each row and handle multiple Hours/Notes pairs
-                    for _, row in df.iterrows():
-                        # Find all Hours columns
-                        hours_cols = [col for col in row.index if col.startswith('Hours') and not col.startswith('Hours for')]
-                        notes_cols = [col for col in row.index if col.startswith('Notes')]
-                        
+                    # Find all Hours/Notes columns once and pull them out as plain arrays
+                    hours_cols = [col for col in df.columns if col.startswith('Hours') and not col.startswith('Hours for')]
+                    notes_cols = [col for col in df.columns if col.startswith('Notes')]
+                    column_pairs = list(zip(hours_cols, notes_cols))
+                    hours_arrays = [df[col].to_numpy() for col, _ in column_pairs]
+                    notes_arrays = [df[col].to_numpy() for _, col in column_pairs]
+                    dates = df['Date'].tolist()
+                    
+                    for i in range(len(df)):
                         # Process each Hours/Notes pair
-                        for hours_col, notes_col in zip(hours_cols, notes_cols):
-                            if pd.isna(row[hours_col]):
+                        for j, (hours_col, notes_col) in enumerate(column_pairs):
+                            time_entry = hours_arrays[j][i]
+                            if pd.isna(time_entry):
                                 continue
                                 
-                            hours = estimate_hours(row[hours_col])
+                            hours = estimate_hours(time_entry)
                             if not hours:
                                 continue
                                 
                             # Step 5: Parse the semi-structured notes
-                            note = row.get(notes_col)
+                            note = notes_arrays[j][i]
                             district, initials, task = parse_note_format(note)
                             
-                            # Create record with all extracted information
-                            record = {
-                                'Date': row['Date'],
-                                'Psychologist': current_contractor,
-                                'Hours': hours,
-                                'District': district,
-                                'Student Initials': initials,
-                                'Raw Task': task,
-                                'Standardized Task': standardize_task(task),
-                                'Time Entry': row[hours_col],
-                                'Note': note,
-                                'Hours Column': hours_col,  # Track which hours column was used
-                                'Notes Column': notes_col   # Track which notes column was used
-                            }
-                            all_records.append(record)
+                            # Create record with all extracted information, in upload_columns order
+                            all_records.append((
+                                dates[i], current_contractor, hours, district, initials, task,
+                                time_entry, note,
+                                hours_col,  # Track which hours column was used
+                                notes_col   # Track which notes column was used
+                            ))
                 
                 processed_blocks += 1
                             
@@ -483,25 +602,21 @@ def process_gusto_file(file_content):
         if not all_records:
             raise Exception(f"No valid records found in file. Processed blocks: {processed_blocks}, Error blocks: {error_blocks}")
             
-        df = pd.DataFrame(all_records)
+        df = pd.DataFrame.from_records(all_records, columns=upload_columns)
+        df.insert(df.columns.get_loc('Raw Task') + 1, 'Standardized Task', standardize_tasks(df['Raw Task']))
         
         # Step 7: Add derived columns and calculations
         df['Month'] = df['Date'].dt.to_period('M')
         df['Week'] = df['Date'].dt.to_period('W')
         
-        # Calculate costs using psychologist-specific rates
-        psychologist_rates = {
-            "Nancy": 95, "Kathleen": 95, "David": 95, "Melissa": 95, "Emily": 95, "Tarik": 95,
-            "Angela": 70, "Caroline": 70, "Julie": 70, "Lexi": 70, "Shirley": 70
-        }
-        
-        # Extract first name for rate lookup
-        df['Psychologist_First_Name'] = df['Psychologist'].apply(lambda x: x.split()[0] if isinstance(x, str) else None)
-        df['Rate'] = df['Psychologist_First_Name'].map(psychologist_rates).fillna(100)  # Default to 100 if not found
+        # Calculate costs using psychologist-specific rates, keyed by first name
+        first_names = df['Psychologist'].str.split(n=1).str[0]
+        df['Rate'] = first_names.map(psychologist_rates).fillna(100)  # Default to 100 if not found
         df['Cost'] = df['Hours'] * df['Rate']
         
-        # Clean up temporary columns
-        df = df.drop(columns=['Psychologist_First_Name'])
+        # Store the dashboard's filter and grouping labels as categoricals
+        label_columns = ['District', 'Psychologist', 'Standardized Task', 'Student Initials']
+        df[label_columns] = df[label_columns].astype('category')
         
         print(f"Successfully processed {processed_blocks} blocks with {error_blocks} errors")
         print(f"Total records extracted: {len(df)}")
@@ -514,33 +629,32 @@ def process_gusto_file(file_content):
 def process_gusto_upload(uploaded_file):
     """Process uploaded Gusto file and return cleaned DataFrame."""
     try:
-        # Get file content
-        content = uploaded_file.getvalue().decode('utf-8')
-        
-        # Process the data
-        df = process_gusto_file(content)
+        # Hand the raw bytes over; blocks are decoded by pandas as they are parsed
+        df = process_gusto_file(uploaded_file.getvalue())
         return df
         
     except Exception as e:
         raise Exception(f"Error processing Gusto file: {str(e)}")
 
 def parse_note_format(note):
-    """Parse a note into district, student initials, and task."""
+    """Parse a note into district, student initials, and task with a single split."""
     if pd.isna(note):
         return None, None, None
         
-    note = str(note).strip()
+    # Remove time range if present at the start, then split by '>' once
+    note = time_prefix_spaced_pattern.sub('', str(note).strip())
+    parts = note.split('>')
     
-    # Remove time range if present at the start
-    note = re.sub(r'^\d{1,2}:\d{2}(?: ?[APMapm]{2})?\s*-\s*\d{1,2}:\d{2}(?: ?[APMapm]{2})?\s*>?\s*', '', note)
+    district = standardize_district(parts[0])
     
-    # Split by '>'
-    parts = [p.strip() for p in note.split('>')]
+    # Initials follow the district, skipping a second time range if one leads the note
+    initials = None
+    initial_parts = parts[1:] if leading_time_pattern.match(parts[0]) else parts
+    if len(parts) > 1 and len(initial_parts) >= 2:
+        found = initials_pattern.findall(initial_parts[1].upper())
+        initials = ", ".join(found) if found else None
     
-    # Extract components
-    district = standardize_district(parts[0]) if len(parts) > 0 else None
-    initials = extract_student_initials(note) if len(parts) > 1 else None
-    task = extract_task(note) if len(parts) > 2 else None
+    task = parts[2].split('-')[0].strip() if len(parts) > 2 else None
     
     return district, initials, task
 
@@ -555,18 +669,12 @@ if __name__ == "__main__":
 
     # Parse and clean the main dataset
     df = parse_gusto_file(input_file)
-    df.fillna("", inplace=True)
-
-    # Define psychologist hourly rates
-    psychologist_rates = {
-        "Nancy": 95, "Kathleen": 95, "David": 95, "Melissa": 95, "Emily": 95, "Tarik": 95,
-        "Angela": 70, "Caroline": 70, "Julie": 70, "Lexi": 70, "Shirley": 70
-    }
+    for col in df.select_dtypes("category").columns:
+        df[col] = df[col].cat.set_categories(df[col].cat.categories.union([""]))
 
-    # Add hourly rate and cost columns to cleaned dataset
-    df["Psychologist Clean"] = df["Psychologist"].apply(lambda x: x.split()[0] if isinstance(x, str) else x)
-    df["Hourly Rate"] = df["Psychologist Clean"].map(psychologist_rates)
-    df["Estimated Cost"] = df["Estimated Hours"] * df["Hourly Rate"]
+    # Blank out missing labels; rate and cost stay numeric for the reports
+    text_columns = df.select_dtypes(exclude="number").columns
+    df[text_columns] = df[text_columns].fillna("")
 
     # Save the cleaned dataset with cost data
     df.to_csv(output_file, index=False)
@@ -579,7 +687,6 @@ if __name__ == "__main__":
     monthly_expense_file = "Monthly_Expense_Summary.csv"
     generate_monthly_expense_summary(df, monthly_expense_file)
 
-
     # Create student task breakdown summary
     generate_student_task_breakdown(df, breakdown_file)
 
@@ -3,16 +3,18 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-from io import StringIO
+from io import StringIO, BytesIO
 import re
 from clean_gusto_multi import process_gusto_upload
 from quickbooks_parser import process_quickbooks_upload, generate_revenue_summary, generate_evaluation_counts, generate_service_bundle_analysis
 from school_calendar import generate_school_day_analysis
 import numpy as np
-from datetime import datetime
+from datetime import datetime, timedelta
 import os
 import jinja2
 import json
+import hashlib
+import inspect
 
 # ========== PAGE CONFIG ==========
 st.set_page_config(
@@ -57,46 +59,310 @@ with st.sidebar:
         key="gusto_file",
         help=gusto_help
     )
+    
+    # Parsed uploads stay in memory only unless the user opts in
+    keep_parsed_on_disk = st.checkbox(
+        "💾 Keep parsed uploads on disk",
+        value=False,
+        help="Save parsed data under .cache/ so restarts and other sessions skip parsing. "
+             "Entries expire after 7 days; untick to parse fresh without reading the disk copy."
+    )
 
 # ========== DATA PROCESSING ==========
-@st.cache_data
-def load_and_process_data(quickbooks_file, gusto_file):
+# Opt-in on-disk copies of parsed uploads, pruned by age and count
+parsed_cache_dir = os.path.join('.cache', 'parsed_uploads')
+parsed_cache_max_files = 8
+parsed_cache_max_age = timedelta(days=7)
+
+def parse_uploads(quickbooks_bytes, gusto_bytes):
+    """Parse both exports into the frames the dashboard filters."""
     qb_df = None
     gusto_df = None
     
-    if quickbooks_file is None:
-        st.warning("⚠️ Please upload QuickBooks financial data to begin analysis.")
-        st.stop()
-    
     # Process QuickBooks data
     try:
-        qb_df = process_quickbooks_upload(quickbooks_file)
+        qb_df = process_quickbooks_upload(BytesIO(quickbooks_bytes))
         if qb_df is None or qb_df.empty:
             st.error("❌ No valid records found in QuickBooks file")
             st.stop()
+        # Sort by service date once so date-range filters can slice with searchsorted
+        qb_df = qb_df.sort_values('Date', kind='stable', ignore_index=True)
+        # Low-cardinality labels as categoricals: isin and groupby run on integer codes
+        qb_df = qb_df.astype({
+            'District': 'category',
+            'Service Type': 'category',
+            'Service Bundle': 'category',
+            'Student Initials': 'category'
+        })
+        # Flag evaluation rows once per upload (excluding add-on services): match the few
+        # service type categories, then gather by code (-1 for missing picks the trailing False)
+        service_types = qb_df['Service Type'].cat
+        is_add_on = service_types.categories.str.contains('Academic Testing|IEP Meeting|Setup|Remote', case=False)
+        qb_df['is_evaluation'] = ~np.append(np.asarray(is_add_on, dtype=bool), False)[service_types.codes.to_numpy()]
     except Exception as e:
         st.error("❌ Error processing QuickBooks data:")
         st.error(str(e))
         st.stop()
     
     # Process Gusto data if available
-    if gusto_file:
+    if gusto_bytes:
         try:
-            gusto_df = process_gusto_upload(gusto_file)
+            gusto_df = process_gusto_upload(BytesIO(gusto_bytes))
             if gusto_df is None or gusto_df.empty:
                 st.warning("⚠️ No valid records found in Gusto file")
+            else:
+                # Free-text columns are never aggregated here; drop them so every filtered copy stays slim
+                gusto_df = gusto_df.drop(columns=['Raw Task', 'Time Entry', 'Note', 'Hours Column', 'Notes Column'])
+                gusto_df = gusto_df.sort_values('Date', kind='stable', ignore_index=True)
+                # Hours only need display precision; dollar columns stay float64 so cent totals are exact
+                gusto_df['Hours'] = pd.to_numeric(gusto_df['Hours'], downcast='float')
         except Exception as e:
             st.warning("⚠️ Error processing Gusto data:")
             st.warning(str(e))
     
     return qb_df, gusto_df
 
+def upload_digest(quickbooks_bytes, gusto_bytes):
+    """Content hash of both uploads and the parsing code, so parser edits never reuse old entries."""
+    digest = hashlib.sha1(inspect.getsource(parse_uploads).encode())
+    for parser in (process_quickbooks_upload, process_gusto_upload):
+        with open(inspect.getsourcefile(parser), 'rb') as f:
+            digest.update(f.read())
+    digest.update(hashlib.sha1(quickbooks_bytes).digest())
+    digest.update(hashlib.sha1(gusto_bytes or b'').digest())
+    return digest.hexdigest()
+
+def prune_parsed_cache():
+    """Drop on-disk entries past parsed_cache_max_age, then all but the newest parsed_cache_max_files."""
+    entries = sorted(
+        (entry for entry in os.scandir(parsed_cache_dir) if entry.name.endswith('.pkl')),
+        key=lambda entry: entry.stat().st_mtime,
+        reverse=True
+    )
+    cutoff = (datetime.now() - parsed_cache_max_age).timestamp()
+    for i, entry in enumerate(entries):
+        if i >= parsed_cache_max_files or entry.stat().st_mtime < cutoff:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass  # another session pruned it first
+
+@st.cache_data(max_entries=4)
+def load_and_process_data(_quickbooks_bytes, _gusto_bytes, data_key, keep_on_disk=False):
+    """Parse both exports; cached in memory on data_key, and on disk as well when keep_on_disk is set."""
+    cache_path = os.path.join(parsed_cache_dir, f'{data_key}.pkl')
+    if keep_on_disk and os.path.exists(cache_path):
+        try:
+            parsed = pd.read_pickle(cache_path)
+            os.utime(cache_path)  # reuse counts as recent when pruning
+            return parsed
+        except Exception:
+            pass  # unreadable entry: parse again and overwrite it
+    
+    parsed = parse_uploads(_quickbooks_bytes, _gusto_bytes)
+    if keep_on_disk:
+        os.makedirs(parsed_cache_dir, exist_ok=True)
+        # Write then rename so other sessions never read a half-written entry
+        temp_path = f'{cache_path}.{os.getpid()}.tmp'
+        pd.to_pickle(parsed, temp_path)
+        os.replace(temp_path, cache_path)
+        prune_parsed_cache()
+    return parsed
+
+def filter_by_selection(df, start_date, end_date, districts, psychologists=None):
+    """Filter to the selected service dates, districts and, optionally, psychologists."""
+    # Frames are sorted by Date at load time (NaT last), so the date range is a positional slice
+    dates = df['Date'].to_numpy()
+    lo = np.searchsorted(dates, np.datetime64(start_date), side='left')
+    hi = np.searchsorted(dates, np.datetime64(end_date + timedelta(days=1)), side='left')
+    in_range = df.iloc[lo:hi]
+    
+    # AND the remaining conditions into one boolean array in place (copied, so it is writable under copy-on-write)
+    mask = in_range['District'].isin(districts).to_numpy(copy=True)
+    if psychologists is not None:
+        np.logical_and(mask, in_range['Psychologist'].isin(psychologists).to_numpy(), out=mask)
+    return in_range[mask]
+
+@st.cache_data(max_entries=32)
+def compute_financial_kpis(_filtered_qb, _eval_data, _filtered_gusto, selection_key):
+    """Revenue, evaluation count and monthly revenue/evaluation/cost table for the current selection.
+
+    Frames are underscored so Streamlit skips hashing them; selection_key identifies them instead.
+    """
+    total_revenue = _filtered_qb['Amount'].sum()
+    
+    # One pass over the evaluation rows: unique (Month, District, Evaluation Number) keys
+    monthly_eval_keys = _eval_data.groupby(['Month', 'District', 'Evaluation Number'], observed=True).size().index
+    
+    # Count unique evaluations
+    total_evals = monthly_eval_keys.droplevel('Month').nunique()
+    
+    # Calculate monthly metrics
+    monthly_data = pd.DataFrame({
+        'Revenue': _filtered_qb.groupby('Month')['Amount'].sum(),
+        'Evaluations': monthly_eval_keys.to_frame(index=False).groupby('Month').size(),
+    })
+    
+    if _filtered_gusto is not None:
+        # Calculate monthly costs and margins
+        monthly_costs = _filtered_gusto.groupby('Month')['Cost'].sum()
+        monthly_data['Cost'] = monthly_costs
+        monthly_data['Gross Margin'] = monthly_data['Revenue'] - monthly_data['Cost']
+        monthly_data['Gross Margin %'] = (monthly_data['Gross Margin'] / monthly_data['Revenue'] * 100).round(1)
+    
+    monthly_data['Avg Revenue Per Eval'] = monthly_data['Revenue'] / monthly_data['Evaluations']
+    
+    return total_revenue, total_evals, monthly_data
+
+@st.cache_data(max_entries=32)
+def compute_psych_totals(_filtered_gusto, selection_key):
+    """Total hours and cost per psychologist, shared by the cost breakdown and efficiency tables."""
+    return (
+        _filtered_gusto
+        .groupby('Psychologist', observed=True)
+        .agg({
+            'Hours': 'sum',
+            'Cost': 'sum'
+        })
+    )
+
+@st.cache_data(max_entries=32)
+def compute_psych_efficiency(_filtered_gusto, selection_key):
+    """Per-psychologist hours, cost, students served and task time shares."""
+    psych_metrics = []
+    psych_totals = compute_psych_totals(_filtered_gusto, selection_key)
+    
+    # Count distinct students per psychologist on the categorical codes rather than strings
+    student_codes = _filtered_gusto['Student Initials'].cat.codes.to_numpy()
+    students_served = (
+        pd.Series(student_codes, index=_filtered_gusto.index)
+        .where(student_codes >= 0)
+        .groupby(_filtered_gusto['Psychologist'], observed=True)
+        .nunique()
+    )
+    
+    # Hours per psychologist and task in a single groupby, only for observed pairs
+    task_hours_grid = (
+        _filtered_gusto
+        .groupby(['Psychologist', 'Standardized Task'], observed=True)['Hours']
+        .sum()
+        .unstack()
+        .sort_index(axis=1)
+    )
+    
+    # Rows follow the (alphabetical) psychologist categories rather than date order
+    for psych in psych_totals.index:
+        # Calculate metrics
+        total_hours = psych_totals.at[psych, 'Hours']
+        total_cost = psych_totals.at[psych, 'Cost']
+        
+        # Count evaluations this psychologist worked on
+        psych_students = students_served[psych]
+        
+        # Get task breakdown
+        task_hours = task_hours_grid.loc[psych].dropna() if psych in task_hours_grid.index else pd.Series(dtype=float)
+        
+        # Calculate efficiency metrics
+        metrics = {
+            'Psychologist': psych,
+            'Total Hours': total_hours,
+            'Total Cost': total_cost,
+            'Students Served': psych_students,
+            'Avg Hours per Student': total_hours / psych_students if psych_students > 0 else 0,
+            'Avg Cost per Student': total_cost / psych_students if psych_students > 0 else 0,
+        }
+        
+        # Add task percentages
+        for task in task_hours.index:
+            metrics[f'{task} %'] = (task_hours[task] / total_hours * 100) if total_hours > 0 else 0
+            
+        psych_metrics.append(metrics)
+    
+    # Fixed column order: per-psychologist metrics, then task shares alphabetically
+    efficiency_columns = [
+        'Psychologist', 'Total Hours', 'Total Cost', 'Students Served',
+        'Avg Hours per Student', 'Avg Cost per Student'
+    ]
+    task_columns = [f'{task} %' for task in task_hours_grid.columns]
+    return pd.DataFrame(psych_metrics, columns=efficiency_columns + task_columns)
+
 # Initialize session state for history if it doesn't exist
 if 'analysis_history' not in st.session_state:
     st.session_state.analysis_history = []
 
+if quickbooks_file is None:
+    st.warning("⚠️ Please upload QuickBooks financial data to begin analysis.")
+    st.stop()
+
 # Load and process the data
-qb_df, gusto_df = load_and_process_data(quickbooks_file, gusto_file)
+quickbooks_bytes = quickbooks_file.getvalue()
+gusto_bytes = gusto_file.getvalue() if gusto_file else None
+data_key = upload_digest(quickbooks_bytes, gusto_bytes)
+qb_df, gusto_df = load_and_process_data(quickbooks_bytes, gusto_bytes, data_key, keep_parsed_on_disk)
+
+# ========== CHARTS ==========
+def make_margin_figure(x, revenue, cost, margin_pct, title, xaxis_title, revenue_labels=None):
+    """Grouped revenue and cost bars with the margin % line on a secondary axis; trace names come from the series.
+
+    Pass revenue_labels when the formatted revenue text is already built for another chart.
+    """
+    if revenue_labels is None:
+        revenue_labels = revenue.map('${:,.0f}'.format)
+    
+    fig = go.Figure()
+    with fig.batch_update():
+        fig.add_traces([
+            # Bars for revenue and cost
+            go.Bar(
+                x=x,
+                y=revenue,
+                name=revenue.name,
+                text=revenue_labels,
+                textposition='auto',
+            ),
+            go.Bar(
+                x=x,
+                y=cost,
+                name=cost.name,
+                text=cost.map('${:,.0f}'.format),
+                textposition='auto',
+            ),
+            # Line for margin percentage
+            go.Scatter(
+                x=x,
+                y=margin_pct,
+                name=margin_pct.name,
+                yaxis='y2',
+                text=margin_pct.map('{:.1f}%'.format),
+                textposition='top center',
+                mode='lines+markers+text',
+                line=dict(width=2),
+                marker=dict(size=8)
+            )
+        ])
+        
+        fig.update_layout(
+            title=title,
+            xaxis_title=xaxis_title,
+            yaxis_title="Amount ($)",
+            yaxis2=dict(
+                title="Margin %",
+                overlaying='y',
+                side='right',
+                range=[0, 100]
+            ),
+            barmode='group',
+            height=500,
+            showlegend=True,
+            legend=dict(
+                orientation="h",
+                yanchor="bottom",
+                y=1.02,
+                xanchor="right",
+                x=1
+            )
+        )
+    return fig
 
 # ========== FILTERS ==========
 st.sidebar.header("🔎 Filters")
@@ -111,7 +377,7 @@ date_range = st.sidebar.date_input(
 )
 
 # District filter from QuickBooks data
-districts = sorted(qb_df['District'].dropna().unique())
+districts = list(qb_df['District'].cat.categories)
 selected_districts = st.sidebar.multiselect(
     "Districts",
     districts,
@@ -119,44 +385,42 @@ selected_districts = st.sidebar.multiselect(
 )
 
 # Apply filters to QuickBooks data
-filtered_qb = qb_df[
-    (qb_df['Date'].dt.date >= date_range[0]) &
-    (qb_df['Date'].dt.date <= date_range[1]) &
-    (qb_df['District'].isin(selected_districts))
-]
+filtered_qb = filter_by_selection(qb_df, date_range[0], date_range[1], tuple(selected_districts))
 
 # Apply filters to Gusto data if available
 if gusto_df is not None:
-    filtered_gusto = gusto_df[
-        (gusto_df['Date'].dt.date >= date_range[0]) &
-        (gusto_df['Date'].dt.date <= date_range[1]) &
-        (gusto_df['District'].isin(selected_districts))
-    ]
-    
     # Psychologist filter only if Gusto data available
-    psychologists = sorted(gusto_df['Psychologist'].dropna().unique())
+    psychologists = list(gusto_df['Psychologist'].cat.categories)
     selected_psychs = st.sidebar.multiselect(
         "Psychologists (Optional)",
         psychologists,
         default=psychologists
     )
-    filtered_gusto = filtered_gusto[filtered_gusto['Psychologist'].isin(selected_psychs)]
+    filtered_gusto = filter_by_selection(
+        gusto_df, date_range[0], date_range[1], tuple(selected_districts), tuple(selected_psychs)
+    )
+
+# Cheap cache key for the filtered frames: the parsed data's digest plus every filter that shaped them
+selection_key = (
+    data_key,
+    date_range[0],
+    date_range[1],
+    tuple(selected_districts),
+    tuple(selected_psychs) if gusto_df is not None else None
+)
 
 # ========== FINANCIAL METRICS ==========
 st.header("💰 Financial Performance")
 st.info("All metrics are based on service dates (when evaluations were completed) rather than invoice dates.")
 
-# Calculate financial KPIs from QuickBooks data
-total_revenue = filtered_qb['Amount'].sum()
+# Evaluation rows were flagged once in load_and_process_data
+eval_data = filtered_qb[filtered_qb['is_evaluation']]
 
-# Count unique evaluations (excluding add-on services)
-eval_mask = (
-    ~filtered_qb['Service Type'].str.contains('Academic Testing|IEP Meeting|Setup|Remote', na=False, case=False)
+# Calculate financial KPIs and monthly metrics once per filter selection
+total_revenue, total_evals, monthly_data = compute_financial_kpis(
+    filtered_qb, eval_data, filtered_gusto if gusto_df is not None else None, selection_key
 )
 
-# Count unique evaluations
-total_evals = filtered_qb[eval_mask].groupby(['District', 'Evaluation Number'])['Service Type'].count().shape[0]
-
 avg_revenue_per_eval = total_revenue / total_evals if total_evals > 0 else 0
 
 # Display financial KPIs
@@ -184,20 +448,9 @@ if gusto_df is not None:
 # Monthly metrics
 st.subheader("Monthly Analysis")
 
-# Calculate monthly metrics
-monthly_data = pd.DataFrame({
-    'Revenue': filtered_qb.groupby('Month')['Amount'].sum(),
-    'Evaluations': filtered_qb[eval_mask].groupby(['Month', 'District', 'Evaluation Number'])['Service Type'].count().reset_index().groupby('Month').size(),
-})
-
-if gusto_df is not None:
-    # Calculate monthly costs and margins
-    monthly_costs = filtered_gusto.groupby('Month')['Cost'].sum()
-    monthly_data['Cost'] = monthly_costs
-    monthly_data['Gross Margin'] = monthly_data['Revenue'] - monthly_data['Cost']
-    monthly_data['Gross Margin %'] = (monthly_data['Gross Margin'] / monthly_data['Revenue'] * 100).round(1)
-
-monthly_data['Avg Revenue Per Eval'] = monthly_data['Revenue'] / monthly_data['Evaluations']
+# Month stays a Period for grouping; format the axis labels once for every chart
+month_labels = monthly_data.index.astype(str)
+revenue_labels = monthly_data['Revenue'].map('${:,.0f}'.format)
 
 # Display monthly metrics
 col1, col2 = st.columns(2)
@@ -206,10 +459,10 @@ with col1:
     # Monthly revenue by service date
     fig = go.Figure(data=[
         go.Bar(
-            x=monthly_data.index.astype(str),
+            x=month_labels,
             y=monthly_data['Revenue'],
             name='Revenue',
-            text=[f"${x:,.0f}" for x in monthly_data['Revenue']],
+            text=revenue_labels,
             textposition='auto',
         )
     ])
@@ -228,7 +481,7 @@ with col2:
     # Monthly evaluations by service date
     fig = go.Figure(data=[
         go.Bar(
-            x=monthly_data.index.astype(str),
+            x=month_labels,
             y=monthly_data['Evaluations'],
             name='Evaluations',
             text=monthly_data['Evaluations'],
@@ -248,58 +501,14 @@ with col2:
 
 if gusto_df is not None:
     # Add gross margin chart
-    fig = go.Figure()
-    
-    # Add bars for revenue and cost
-    fig.add_trace(go.Bar(
-        x=monthly_data.index.astype(str),
-        y=monthly_data['Revenue'],
-        name='Revenue',
-        text=[f"${x:,.0f}" for x in monthly_data['Revenue']],
-        textposition='auto',
-    ))
-    
-    fig.add_trace(go.Bar(
-        x=monthly_data.index.astype(str),
-        y=monthly_data['Cost'],
-        name='Cost',
-        text=[f"${x:,.0f}" for x in monthly_data['Cost']],
-        textposition='auto',
-    ))
-    
-    # Add line for margin percentage
-    fig.add_trace(go.Scatter(
-        x=monthly_data.index.astype(str),
-        y=monthly_data['Gross Margin %'],
-        name='Gross Margin %',
-        yaxis='y2',
-        text=[f"{x:.1f}%" for x in monthly_data['Gross Margin %']],
-        textposition='top center',
-        mode='lines+markers+text',
-        line=dict(width=2),
-        marker=dict(size=8)
-    ))
-    
-    fig.update_layout(
+    fig = make_margin_figure(
+        month_labels,
+        monthly_data['Revenue'],
+        monthly_data['Cost'],
+        monthly_data['Gross Margin %'],
         title="Monthly Revenue, Cost, and Margin",
         xaxis_title="Month",
-        yaxis_title="Amount ($)",
-        yaxis2=dict(
-            title="Margin %",
-            overlaying='y',
-            side='right',
-            range=[0, 100]
-        ),
-        barmode='group',
-        height=500,
-        showlegend=True,
-        legend=dict(
-            orientation="h",
-            yanchor="bottom",
-            y=1.02,
-            xanchor="right",
-            x=1
-        )
+        revenue_labels=revenue_labels
     )
     
     st.plotly_chart(fig, use_container_width=True)
@@ -311,8 +520,8 @@ This analysis shows revenue per school day, calculated by dividing each month's
 This helps normalize revenue across months with different numbers of school days (e.g. February vs March).
 """)
 
-# Generate school day analysis
-overall_metrics, monthly_school_metrics = generate_school_day_analysis(filtered_qb)
+# Generate school day analysis, reusing the monthly revenue already computed above
+overall_metrics, monthly_school_metrics = generate_school_day_analysis(filtered_qb, monthly_data['Revenue'])
 
 # Display overall metrics
 col1, col2 = st.columns(2)
@@ -385,22 +594,15 @@ if gusto_df is not None:
     Costs may span multiple months, but are matched to the student's evaluation revenue.
     """)
 
-    # Get evaluation data with student info
-    eval_data = filtered_qb[eval_mask].copy()
-    
     # Group by student and evaluation number to get total revenue
     student_revenue = (
         eval_data
-        .groupby(['Student Initials', 'Evaluation Number'])
-        .agg({
-            'Amount': 'sum',
-            'Date': 'min'  # Use first date as service date
+        .groupby(['Student Initials', 'Evaluation Number'], observed=True)
+        .agg(**{
+            'Revenue': ('Amount', 'sum'),
+            'Service Date': ('Date', 'min')  # Use first date as service date
         })
         .reset_index()
-        .rename(columns={
-            'Amount': 'Revenue',
-            'Date': 'Service Date'
-        })
     )
     
     # Add month for grouping
@@ -413,25 +615,15 @@ if gusto_df is not None:
         # Group costs by student and evaluation
         student_costs = (
             filtered_gusto
-            .groupby(['Student Initials'])
-            .agg({
-                'Cost': 'sum',
-                'Hours': 'sum'
-            })
-            .reset_index()
-            .rename(columns={
-                'Cost': 'Total Cost',
-                'Hours': 'Total Hours'
+            .groupby(['Student Initials'], observed=True, sort=False)  # order comes from the join below
+            .agg(**{
+                'Total Cost': ('Cost', 'sum'),
+                'Total Hours': ('Hours', 'sum')
             })
         )
         
-        # Merge revenue and costs
-        student_analysis = pd.merge(
-            student_revenue,
-            student_costs,
-            on=['Student Initials'],
-            how='left'
-        )
+        # Look up each evaluation's student costs by index (one row per student, so no row growth)
+        student_analysis = student_revenue.join(student_costs, on='Student Initials')
         
         # Calculate margins
         student_analysis['Total Cost'] = student_analysis['Total Cost'].fillna(0)
@@ -442,75 +634,27 @@ if gusto_df is not None:
         monthly_margins = (
             student_analysis
             .groupby('Month')
-            .agg({
-                'Revenue': 'sum',
-                'Total Cost': 'sum',
-                'Student Initials': 'nunique',
-                'Evaluation Number': 'count'
+            .agg(**{
+                'Revenue': ('Revenue', 'sum'),
+                'Total Cost': ('Total Cost', 'sum'),
+                'Unique Students': ('Student Initials', 'nunique'),
+                'Total Evaluations': ('Evaluation Number', 'count')
             })
             .reset_index()
         )
         
         monthly_margins['Margin'] = monthly_margins['Revenue'] - monthly_margins['Total Cost']
         monthly_margins['Margin %'] = (monthly_margins['Margin'] / monthly_margins['Revenue'] * 100).round(1)
-        monthly_margins = monthly_margins.rename(columns={
-            'Student Initials': 'Unique Students',
-            'Evaluation Number': 'Total Evaluations'
-        })
+        margin_month_labels = monthly_margins['Month'].astype(str)
         
         # Create visualization
-        fig = go.Figure()
-        
-        # Add bars for revenue and cost
-        fig.add_trace(go.Bar(
-            x=monthly_margins['Month'].astype(str),
-            y=monthly_margins['Revenue'],
-            name='Revenue',
-            text=[f"${x:,.0f}" for x in monthly_margins['Revenue']],
-            textposition='auto',
-        ))
-        
-        fig.add_trace(go.Bar(
-            x=monthly_margins['Month'].astype(str),
-            y=monthly_margins['Total Cost'],
-            name='Total Cost',
-            text=[f"${x:,.0f}" for x in monthly_margins['Total Cost']],
-            textposition='auto',
-        ))
-        
-        # Add line for margin percentage
-        fig.add_trace(go.Scatter(
-            x=monthly_margins['Month'].astype(str),
-            y=monthly_margins['Margin %'],
-            name='Margin %',
-            yaxis='y2',
-            text=[f"{x:.1f}%" for x in monthly_margins['Margin %']],
-            textposition='top center',
-            mode='lines+markers+text',
-            line=dict(width=2),
-            marker=dict(size=8)
-        ))
-        
-        fig.update_layout(
+        fig = make_margin_figure(
+            margin_month_labels,
+            monthly_margins['Revenue'],
+            monthly_margins['Total Cost'],
+            monthly_margins['Margin %'],
             title="Monthly Student-Based Revenue, Cost, and Margin",
-            xaxis_title="Service Month",
-            yaxis_title="Amount ($)",
-            yaxis2=dict(
-                title="Margin %",
-                overlaying='y',
-                side='right',
-                range=[0, 100]
-            ),
-            barmode='group',
-            height=500,
-            showlegend=True,
-            legend=dict(
-                orientation="h",
-                yanchor="bottom",
-                y=1.02,
-                xanchor="right",
-                x=1
-            )
+            xaxis_title="Service Month"
         )
         
         st.plotly_chart(fig, use_container_width=True)
@@ -522,7 +666,7 @@ if gusto_df is not None:
         
         # Format the table
         display_table = monthly_margins.copy()
-        display_table['Month'] = display_table['Month'].astype(str)
+        display_table['Month'] = margin_month_labels
         display_table['Revenue'] = display_table['Revenue'].map('${:,.2f}'.format)
         display_table['Total Cost'] = display_table['Total Cost'].map('${:,.2f}'.format)
         display_table['Margin'] = display_table['Margin'].map('${:,.2f}'.format)
@@ -540,20 +684,26 @@ if gusto_df is not None:
         - Resulting margin for the complete evaluation
         """)
         
-        # Format and display student details
+        # Format and display student details; numbers stay numeric and are formatted in the browser
         student_details = student_analysis.copy()
         student_details['Service Date'] = student_details['Service Date'].dt.strftime('%Y-%m-%d')
-        student_details['Revenue'] = student_details['Revenue'].map('${:,.2f}'.format)
-        student_details['Total Cost'] = student_details['Total Cost'].map('${:,.2f}'.format)
-        student_details['Margin'] = student_details['Margin'].map('${:,.2f}'.format)
-        student_details['Margin %'] = student_details['Margin %'].map('{:.1f}%'.format)
         
         # Reorder columns for display
         display_cols = [
             'Student Initials', 'Evaluation Number', 'Service Date',
             'Revenue', 'Total Hours', 'Total Cost', 'Margin', 'Margin %'
         ]
-        st.dataframe(student_details[display_cols].sort_values(['Service Date', 'Student Initials']), use_container_width=True)
+        st.dataframe(
+            student_details[display_cols].sort_values(['Service Date', 'Student Initials']),
+            use_container_width=True,
+            column_config={
+                'Revenue': st.column_config.NumberColumn(format='dollar'),
+                'Total Hours': st.column_config.NumberColumn(format='%.1f'),
+                'Total Cost': st.column_config.NumberColumn(format='dollar'),
+                'Margin': st.column_config.NumberColumn(format='dollar'),
+                'Margin %': st.column_config.NumberColumn(format='%.1f%%')
+            }
+        )
 
 # After the main financial metrics, add cost breakdown
 if gusto_df is not None and not filtered_gusto.empty:
@@ -561,12 +711,7 @@ if gusto_df is not None and not filtered_gusto.empty:
 
     # Calculate costs by psychologist
     psych_costs = (
-        filtered_gusto
-        .groupby('Psychologist')
-        .agg({
-            'Hours': 'sum',
-            'Cost': 'sum'
-        })
+        compute_psych_totals(filtered_gusto, selection_key)
         .round(2)
         .sort_values('Cost', ascending=False)
     )
@@ -596,46 +741,8 @@ if gusto_df is not None and not filtered_gusto.empty:
     - Distribution of time across different tasks
     """)
 
-    # Get evaluation data
-    eval_data = filtered_qb[eval_mask].copy()
-    
-    # Extract student initials and evaluation numbers
-    student_evals = eval_data[['Student Initials', 'Evaluation Number', 'District', 'Date']].drop_duplicates()
-    
-    # Calculate psychologist metrics
-    psych_metrics = []
-    
-    for psych in filtered_gusto['Psychologist'].unique():
-        psych_data = filtered_gusto[filtered_gusto['Psychologist'] == psych]
-        
-        # Calculate metrics
-        total_hours = psych_data['Hours'].sum()
-        total_cost = psych_data['Cost'].sum()
-        
-        # Count evaluations this psychologist worked on
-        psych_students = psych_data['Student Initials'].nunique()
-        
-        # Get task breakdown
-        task_hours = psych_data.groupby('Standardized Task')['Hours'].sum()
-        
-        # Calculate efficiency metrics
-        metrics = {
-            'Psychologist': psych,
-            'Total Hours': total_hours,
-            'Total Cost': total_cost,
-            'Students Served': psych_students,
-            'Avg Hours per Student': total_hours / psych_students if psych_students > 0 else 0,
-            'Avg Cost per Student': total_cost / psych_students if psych_students > 0 else 0,
-        }
-        
-        # Add task percentages
-        for task in task_hours.index:
-            metrics[f'{task} %'] = (task_hours[task] / total_hours * 100) if total_hours > 0 else 0
-            
-        psych_metrics.append(metrics)
-    
-    # Convert to DataFrame
-    psych_efficiency = pd.DataFrame(psych_metrics)
+    # Calculate psychologist metrics (cached per filtered selection)
+    psych_efficiency = compute_psych_efficiency(filtered_gusto, selection_key)
     
     # Format for display
     display_efficiency = psych_efficiency.copy()
@@ -650,28 +757,23 @@ if gusto_df is not None and not filtered_gusto.empty:
         display_efficiency[col] = display_efficiency[col].map('{:,.1f}%'.format)
     
     # Display the efficiency metrics
-    st.dataframe(display_efficiency.sort_values('Students Served', ascending=False), use_container_width=True)
+    st.dataframe(display_efficiency.sort_values('Students Served', ascending=False, kind='stable'), use_container_width=True)
     
     # Add visualization of task distribution
     st.subheader("Task Distribution by Psychologist")
     
-    # Prepare data for visualization
-    task_dist_data = []
-    for _, row in psych_efficiency.iterrows():
-        psych = row['Psychologist']
-        for col in pct_cols:
-            task = col.replace(' %', '')
-            task_dist_data.append({
-                'Psychologist': psych,
-                'Task': task,
-                'Percentage': row[col]
-            })
-    
-    task_dist_df = pd.DataFrame(task_dist_data)
+    # Prepare data for visualization: reshape the task % columns directly into a Psychologist x Task grid
+    task_dist = (
+        psych_efficiency.set_index('Psychologist')[pct_cols]
+        .rename(columns=lambda col: col.replace(' %', ''))
+        .rename_axis(index='Psychologist', columns='Task')
+        .sort_index()
+        .sort_index(axis=1)
+    )
     
     # Create heatmap with adjusted height
     fig = px.imshow(
-        task_dist_df.pivot(index='Psychologist', columns='Task', values='Percentage'),
+        task_dist,
         labels=dict(x='Task', y='Psychologist', color='% of Time'),
         aspect='auto',
         color_continuous_scale='RdYlBu_r'
@@ -917,9 +1019,9 @@ if st.sidebar.button("📤 Publish Analysis"):
             })
             
             # Add task distribution chart if it exists
-            if 'task_dist_df' in locals():
+            if 'task_dist' in locals():
                 fig = px.imshow(
-                    task_dist_df.pivot(index='Psychologist', columns='Task', values='Percentage'),
+                    task_dist,
                     labels=dict(x='Task', y='Psychologist', color='% of Time'),
                     aspect='auto',
                     color_continuous_scale='RdYlBu_r'
@@ -3,6 +3,18 @@ import re
 from datetime import datetime
 import io
 
+# --- Compiled Patterns ---
+
+# Evaluation number formats, tried in order
+eval_number_patterns = [
+    re.compile(r'Evaluation #?\s*(\d+)'),  # Standard format: "Evaluation #123" or "Evaluation 123"
+    re.compile(r'Eval #?\s*(\d+)'),        # Abbreviated: "Eval #123" or "Eval 123"
+    re.compile(r'#\s*(\d+)'),              # Just the number: "#123"
+    re.compile(r'\(#(\d+)\)'),             # Parenthesized: "(#123)"
+    re.compile(r'(\d{2,})')                # Any 2+ digit number (last resort, might be noisy)
+]
+initials_pattern = re.compile(r'\(([A-Z]{2,3})\)')
+
 def extract_service_components(description):
     """Extract detailed service components from description."""
     if pd.isna(description):
@@ -46,37 +58,24 @@ def extract_service_components(description):
         
     return components
 
-def extract_student_info(description):
-    """Extract student initials and service type from description."""
-    if pd.isna(description):
-        return None, None, None, []
-        
-    description = str(description).strip()
-    
-    # Extract evaluation number - handle more formats
-    eval_num = None
-    eval_patterns = [
-        r'Evaluation #?\s*(\d+)',  # Standard format: "Evaluation #123" or "Evaluation 123"
-        r'Eval #?\s*(\d+)',        # Abbreviated: "Eval #123" or "Eval 123"
-        r'#\s*(\d+)',              # Just the number: "#123"
-        r'\(#(\d+)\)',             # Parenthesized: "(#123)"
-        r'(\d{2,})'                # Any 2+ digit number (last resort, might be noisy)
-    ]
-    
-    for pattern in eval_patterns:
-        match = re.search(pattern, description)
-        if match:
-            eval_num = match.group(1)
+def extract_first_match(descriptions, patterns):
+    """Vectorized first capture group over a Series of descriptions, trying each pattern in order."""
+    text = descriptions.astype(str).str.strip()
+    matches = pd.Series(None, index=descriptions.index, dtype=object)
+    for pattern in patterns:
+        missing = descriptions.notna() & matches.isna()
+        if not missing.any():
             break
-    
-    # Extract student initials (in parentheses)
-    initials_match = re.search(r'\(([A-Z]{2,3})\)', description)
-    initials = initials_match.group(1) if initials_match else None
-    
-    # Extract service components
-    components = extract_service_components(description)
-    
-    # Determine primary service type
+        matches[missing] = text[missing].str.extract(pattern, expand=False)
+    return matches.where(matches.notna(), None)
+
+def parse_export_dates(values):
+    """Parse MM/DD/YYYY dates in one vectorized pass; other values are left for per-value parsing."""
+    parsed = pd.to_datetime(values, format='%m/%d/%Y', errors='coerce')
+    return parsed.astype(object).where(parsed.notna(), values)
+
+def determine_service_type(components):
+    """Pick the primary service type from a list of service components."""
     service_type = None
     if components:
         if 'Multilingual Evaluation' in components:
@@ -96,7 +95,7 @@ def extract_student_info(description):
         elif 'Remote Setup' in components:
             service_type = 'Setup Fee'
     
-    return initials, eval_num, service_type, components
+    return service_type
 
 def clean_amount(amount_str):
     """Clean amount string to numeric value."""
@@ -171,15 +170,30 @@ def process_quickbooks_file(file_content):
         # Initialize lists for records
         records = []
         
+        # Extract student initials and evaluation numbers for every description at once
+        student_initials = extract_first_match(df['Line description'], [initials_pattern])
+        eval_numbers = extract_first_match(df['Line description'], eval_number_patterns)
+        
+        # Parse service and transaction dates up front on the fixed-format fast path
+        transaction_dates = parse_export_dates(df['Transaction date'])
+        if 'Service date' in df.columns:
+            service_dates = parse_export_dates(df['Service date'])
+        else:
+            service_dates = pd.Series(None, index=df.index, dtype=object)
+        
         # Process each row
-        for _, row in df.iterrows():
+        for idx, row in df.iterrows():
             # Skip empty rows and total rows
             if pd.isna(row['Transaction date']) or str(row.get('Transaction type', '')).lower().startswith('total'):
                 continue
                 
             try:
-                # Extract student info and service components
-                initials, eval_num, service_type, components = extract_student_info(row['Line description'])
+                # Extract service components
+                description = row['Line description']
+                initials = student_initials[idx]
+                eval_num = eval_numbers[idx]
+                components = extract_service_components(description)
+                service_type = determine_service_type(components)
                 
                 # Get customer from the Customer column or use the last known customer
                 customer = row['Customer'] if pd.notna(row['Customer']) else current_customer
@@ -187,11 +201,11 @@ def process_quickbooks_file(file_content):
                     current_customer = customer
                 
                 # Use service date if available, otherwise fall back to transaction date
-                date = pd.to_datetime(row['Service date']) if pd.notna(row.get('Service date')) else pd.to_datetime(row['Transaction date'])
+                date = pd.to_datetime(service_dates[idx]) if pd.notna(service_dates[idx]) else pd.to_datetime(transaction_dates[idx])
                 
                 record = {
                     'Date': date,
-                    'Invoice Date': pd.to_datetime(row['Transaction date']),
+                    'Invoice Date': pd.to_datetime(transaction_dates[idx]),
                     'Customer': customer,
                     'Invoice': row['Num'],
                     'Service': row['Product/Service full name'],
@@ -279,20 +293,20 @@ def process_quickbooks_upload(uploaded_file):
 
 def generate_revenue_summary(df, group_by='District'):
     """Generate revenue summary by specified grouping."""
-    summary = df.groupby([group_by, 'Month'])['Amount'].sum().unstack(fill_value=0)
+    summary = df.groupby([group_by, 'Month'], observed=True)['Amount'].sum().unstack(fill_value=0)
     summary.loc['Total'] = summary.sum()
     return summary
 
 def generate_evaluation_counts(df, group_by='District'):
     """Generate evaluation counts by specified grouping."""
     evals = df[df['Service Type'].str.contains('Evaluation', na=False)]
-    counts = evals.groupby([group_by, 'Month'])['Evaluation Number'].nunique().unstack(fill_value=0)
+    counts = evals.groupby([group_by, 'Month'], observed=True)['Evaluation Number'].nunique().unstack(fill_value=0)
     counts.loc['Total'] = counts.sum()
     return counts
 
 def generate_service_bundle_analysis(df):
     """Generate analysis of service bundles and their revenue."""
-    bundle_summary = df.groupby(['Service Bundle', 'District']).agg({
+    bundle_summary = df.groupby(['Service Bundle', 'District'], observed=True).agg({
         'Amount': ['sum', 'mean', 'count'],
         'Student Initials': 'nunique'
     }).round(2)
@@ -302,5 +316,5 @@ def generate_service_bundle_analysis(df):
 
 def generate_pricing_analysis(df):
     """Generate analysis of pricing patterns by district and service type."""
-    pricing = df.groupby(['District', 'Service Type', 'Service Bundle'])['Unit Price'].agg(['min', 'max', 'mean', 'count']).round(2)
+    pricing = df.groupby(['District', 'Service Type', 'Service Bundle'], observed=True)['Unit Price'].agg(['min', 'max', 'mean', 'count']).round(2)
     return pricing 
\ No newline at end of file
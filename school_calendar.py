@@ -75,10 +75,11 @@ def get_school_days_in_range(start_date, end_date):
     
     return school_days
 
-def calculate_school_day_metrics(df):
+def calculate_school_day_metrics(df, monthly_revenue=None):
     """
     Calculate metrics based on school days for the given DataFrame.
     Expects a DataFrame with 'Date' column and 'Amount' column.
+    monthly_revenue can be passed when revenue per month is already computed.
     """
     # Ensure Date column is datetime
     df['Date'] = pd.to_datetime(df['Date'])
@@ -105,7 +106,8 @@ def calculate_school_day_metrics(df):
     )
     
     # Calculate revenue per month
-    monthly_revenue = df.groupby(df['Date'].dt.to_period('M'))['Amount'].sum()
+    if monthly_revenue is None:
+        monthly_revenue = df.groupby(df['Date'].dt.to_period('M'))['Amount'].sum()
     
     # Combine into metrics
     metrics = pd.DataFrame({
@@ -130,13 +132,13 @@ def calculate_school_day_metrics(df):
     
     return overall_metrics, metrics
 
-def generate_school_day_analysis(df):
+def generate_school_day_analysis(df, monthly_revenue=None):
     """
     Generate a detailed analysis of revenue by school days.
     Returns both summary metrics and monthly breakdown.
     """
     # Calculate metrics
-    overall_metrics, monthly_metrics = calculate_school_day_metrics(df)
+    overall_metrics, monthly_metrics = calculate_school_day_metrics(df, monthly_revenue)
     
     # Convert monthly metrics to DataFrame with month as column
     monthly_df = monthly_metrics.reset_index()